@@ -15,10 +15,19 @@ Licensed under MIT License
 import customtkinter as ctk
 import subprocess
 import threading
+import time
 import os
 import re
 import json
-from tkinter import filedialog, messagebox
+import queue
+import shutil
+import sys
+import tempfile
+from collections import deque
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+from tkinter import filedialog, messagebox, TclError
 import pygame
 from pathlib import Path
 
@@ -26,6 +35,226 @@ from pathlib import Path
 ctk.set_appearance_mode("Dark")
 ctk.set_default_color_theme("blue")
 
+class EventLog:
+    """Nhật ký sự kiện có cấu trúc (JSON lines) ghi bởi một luồng nền
+
+    log() chỉ đưa bản ghi vào hàng đợi có giới hạn rồi trả về ngay; khi hàng
+    đợi đầy thì bỏ bản ghi và đếm lại số bị bỏ, không bao giờ chặn luồng tải.
+    Sau close(), các sự kiện còn lại (vd. từ pool chuyển file) được ghi thẳng.
+    File được xoay vòng theo dung lượng (events.jsonl -> events.jsonl.1 ...).
+    """
+
+    LEVELS = {'DEBUG': 10, 'INFO': 20, 'WARNING': 30, 'ERROR': 40}
+
+    def __init__(self, path=os.path.join("logs", "events.jsonl"), level="INFO",
+                 max_bytes=5 * 1024 * 1024, backup_count=3, buffer_size=1000):
+        self.path = path
+        self.level = self.LEVELS.get(level, 20)
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.queue = queue.Queue(maxsize=buffer_size)
+        self.dropped = 0
+        self.thread = None
+        self.start_lock = threading.Lock()
+        self.write_lock = threading.Lock()
+        self.closed = False
+        # Job ID bắt đầu lại từ 1 mỗi lần mở app, nên mỗi bản ghi mang thêm mã phiên
+        self.session = f"{datetime.now():%Y%m%d-%H%M%S}-{os.getpid()}"
+
+    def configure(self, level=None, max_bytes=None, backup_count=None):
+        if level in self.LEVELS:
+            self.level = self.LEVELS[level]
+        if max_bytes:
+            self.max_bytes = max_bytes
+        if backup_count is not None:
+            self.backup_count = backup_count
+
+    def log(self, level, message, job=None, phase=None, **fields):
+        """Ghi một sự kiện (không chặn)"""
+        if self.LEVELS.get(level, 20) < self.level:
+            return
+        record = {
+            'ts': datetime.now().isoformat(timespec='milliseconds'),
+            'session': self.session,
+            'level': level,
+            'job': job,
+            'phase': phase,
+            'msg': message
+        }
+        record.update(fields)
+
+        if self.closed:
+            with self.write_lock:
+                self._write([record])
+            return
+        if self.thread is None:
+            self._start()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def debug(self, message, **fields):
+        self.log('DEBUG', message, **fields)
+
+    def info(self, message, **fields):
+        self.log('INFO', message, **fields)
+
+    def warning(self, message, **fields):
+        self.log('WARNING', message, **fields)
+
+    def error(self, message, **fields):
+        self.log('ERROR', message, **fields)
+
+    def _start(self):
+        with self.start_lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._writer, daemon=True)
+                self.thread.start()
+
+    def _writer(self):
+        """Luồng nền: gom các bản ghi thành lô, ghi ra file và xoay vòng khi quá dung lượng"""
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < 100:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = None in batch
+            records = [record for record in batch if record is not None]
+            if self.dropped:
+                dropped, self.dropped = self.dropped, 0
+                records.append({
+                    'ts': datetime.now().isoformat(timespec='milliseconds'),
+                    'session': self.session,
+                    'level': 'WARNING', 'job': None, 'phase': None,
+                    'msg': f"Event log buffer full, dropped {dropped} event(s)"
+                })
+
+            with self.write_lock:
+                self._write(records)
+
+            if stop:
+                return
+
+    def _write(self, records):
+        """Ghi các bản ghi ra file (gọi khi giữ write_lock)"""
+        if not records:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                for record in records:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            if os.path.getsize(self.path) >= self.max_bytes:
+                self._rotate()
+        except Exception:
+            pass
+
+        # Vẫn hiện trên console khi chạy bằng terminal (pythonw không có stdout)
+        if sys.stdout:
+            for record in records:
+                try:
+                    print(record['msg'])
+                except Exception:
+                    pass
+
+    def _rotate(self):
+        for i in range(self.backup_count - 1, 0, -1):
+            source = f"{self.path}.{i}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{i + 1}")
+        if self.backup_count > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+    def read_records(self, session=None, job=None, min_level=0, limit=500):
+        """Đọc các bản ghi gần nhất (cũ -> mới) khớp bộ lọc
+
+        Giới hạn `limit` áp dụng sau khi lọc. Trả về (records, jobs) với jobs là
+        tập (session, job) của mọi job có trong nhật ký, dùng cho ô chọn job.
+        """
+        records = deque(maxlen=limit)
+        jobs = set()
+        job_marker = f'"job": {job},' if job is not None else None
+        files = [f"{self.path}.{i}" for i in range(self.backup_count, 0, -1)] + [self.path]
+        for file_path in files:
+            if not os.path.exists(file_path):
+                continue
+            try:
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    for line in f:
+                        # Lọc thô bằng chuỗi trước để không phải parse JSON mọi dòng
+                        if '"job": null' in line:
+                            if job_marker:
+                                continue
+                        else:
+                            match = re.search(r'"session": "([^"]*)".*?"job": (\d+)', line)
+                            if match:
+                                jobs.add((match.group(1), int(match.group(2))))
+                        if job_marker and (job_marker not in line or f'"session": "{session}"' not in line):
+                            continue
+                        try:
+                            record = json.loads(line)
+                        except ValueError:
+                            continue
+                        if job is not None and (record.get('job') != job or record.get('session') != session):
+                            continue
+                        if self.LEVELS.get(record.get('level'), 0) < min_level:
+                            continue
+                        records.append(record)
+            except OSError:
+                continue
+        return list(records), jobs
+
+    def close(self, timeout=2):
+        """Ghi nốt các bản ghi còn trong hàng đợi, từ đó về sau log() ghi thẳng ra file"""
+        self.closed = True
+        if self.thread is None:
+            return
+        try:
+            self.queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        self.thread.join(timeout=timeout)
+        if self.thread.is_alive():
+            return
+        # Bản ghi vào hàng đợi sau dấu dừng
+        records = []
+        while True:
+            try:
+                record = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if record is not None:
+                records.append(record)
+        with self.write_lock:
+            self._write(records)
+
+event_log = EventLog()
+
+# Các định dạng hiển thị trong trình quản lý file (chế độ nhanh giữ nguyên opus/mkv)
+MEDIA_EXTENSIONS = ('.mp4', '.mp3', '.webm', '.m4a', '.opus', '.ogg', '.mkv')
+
+# Số lần tự tải lại một file không qua được bước kiểm tra
+MAX_VERIFY_RETRIES = 1
+
+# Số dòng stderr cuối cùng của yt-dlp được giữ lại trong nhật ký khi job lỗi
+STDERR_TAIL_LINES = 20
+
+# Dung lượng cần trong thư mục tạm so với ước tính (merge / chuyển đổi cần chỗ cho cả nguồn lẫn kết quả)
+STAGING_HEADROOM = 2
+# Ước tính dung lượng playlist từ vài mục đầu (nhân theo số mục), tối đa STAGING_ESTIMATE_TIMEOUT giây
+STAGING_ESTIMATE_SAMPLE = 3
+STAGING_ESTIMATE_TIMEOUT = 30
+STAGING_PARTIAL_SUFFIXES = ('.part', '.ytdl', '.temp', '.tmp')
+
+# Archive của yt-dlp trong thư mục lưu: ghi lại các mục playlist đã tải qua thư mục tạm
+DOWNLOAD_ARCHIVE = ".download_archive.txt"
+
 class LanguageManager:
     def __init__(self, language_folder="language"):
         self.language_folder = language_folder
@@ -36,13 +265,13 @@ class LanguageManager:
     def load_all_languages(self):
         """Tự động load tất cả file .json trong thư mục language"""
         if not os.path.exists(self.language_folder):
-            print(f"Warning: Language folder '{self.language_folder}' not found!")
+            event_log.warning(f"Language folder '{self.language_folder}' not found!")
             return
         
         json_files = [f for f in os.listdir(self.language_folder) if f.endswith('.json')]
         
         if not json_files:
-            print(f"Warning: No language files found in '{self.language_folder}'!")
+            event_log.warning(f"No language files found in '{self.language_folder}'!")
             return
         
         for file in json_files:
@@ -51,13 +280,13 @@ class LanguageManager:
                 file_path = os.path.join(self.language_folder, file)
                 with open(file_path, 'r', encoding='utf-8') as f:
                     self.languages[lang_code] = json.load(f)
-                print(f"Loaded language: {lang_code}")
+                event_log.debug(f"Loaded language: {lang_code}")
             except Exception as e:
-                print(f"Error loading language file {file}: {e}")
+                event_log.error(f"Error loading language file {file}: {e}")
         
         # Kiểm tra xem có ngôn ngữ nào được load không
         if not self.languages:
-            print("Critical: No languages loaded! App may not display text correctly.")
+            event_log.error("No languages loaded! App may not display text correctly.")
     
     def get_text(self, key, default=None):
         """Lấy text theo ngôn ngữ hiện tại với fallback"""
@@ -79,7 +308,7 @@ class LanguageManager:
         if lang_code in self.languages:
             self.current_language = lang_code
             return True
-        print(f"Warning: Language '{lang_code}' not found!")
+        event_log.warning(f"Language '{lang_code}' not found!")
         return False
     
     def get_available_languages(self):
@@ -101,9 +330,9 @@ class MusicPlayer:
                 self.load_music()
             else:
                 os.makedirs(os.path.dirname(music_path), exist_ok=True)
-                print(f"Music file not found: {music_path}")
+                event_log.warning(f"Music file not found: {music_path}")
         except Exception as e:
-            print(f"Failed to initialize music player: {e}")
+            event_log.error(f"Failed to initialize music player: {e}")
     
     def load_music(self):
         """Load nhạc nền"""
@@ -115,7 +344,7 @@ class MusicPlayer:
             pygame.mixer.music.set_volume(self.volume)
             pygame.mixer.music.play(-1)
         except Exception as e:
-            print(f"Cannot load music: {e}")
+            event_log.error(f"Cannot load music: {e}")
     
     def set_volume(self, volume):
         """Điều chỉnh âm lượng (0.0 - 1.0)"""
@@ -149,19 +378,1026 @@ class MusicPlayer:
             except:
                 pass
 
+def format_duration(seconds):
+    """Định dạng thời lượng (giây) thành h:mm:ss hoặc m:ss"""
+    if not seconds:
+        return "--:--"
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    minutes, secs = divmod(rest, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{secs:02d}"
+    return f"{minutes}:{secs:02d}"
+
+def parse_playlist_ranges(text):
+    """Parse chuỗi chọn mục dạng '1-10,15,20-' thành danh sách (start, end)
+
+    end = None nghĩa là tới cuối playlist. Chuỗi rỗng = chọn tất cả.
+    """
+    ranges = []
+    for part in text.replace(" ", "").split(","):
+        if not part:
+            continue
+        match = re.fullmatch(r'(\d*)-(\d*)|(\d+)', part)
+        if not match:
+            raise ValueError(f"Invalid range: {part}")
+        if match.group(3):
+            start = end = int(match.group(3))
+        else:
+            start = int(match.group(1)) if match.group(1) else 1
+            end = int(match.group(2)) if match.group(2) else None
+        if end is not None and end < start:
+            raise ValueError(f"Reversed range: {part}")
+        ranges.append((start, end))
+    return ranges
+
+def ytdlp_filename(title):
+    """Tên file yt-dlp tạo từ tiêu đề (bản rút gọn của yt_dlp.utils.sanitize_filename)
+
+    yt-dlp không xoá các ký tự cấm mà thay bằng ký tự full-width trông giống
+    (| -> ｜, : -> ：, / -> ⧸ ...), nên phải làm giống hệt mới so khớp được.
+    """
+    # Mốc thời gian "10:30" thành "10_30"
+    title = re.sub(r'[0-9]+(?::[0-9]+)+', lambda m: m.group(0).replace(':', '_'), title)
+    chars = []
+    for char in title:
+        if char in '"*:<>?|':
+            chars.append(chr(ord(char) + 0xfee0))
+        elif char == '/':
+            chars.append('\u29f8')
+        elif char == '\\':
+            chars.append('\u29f9')
+        elif char == '\n':
+            chars.append(' ')
+        elif ord(char) < 32 or ord(char) == 127:
+            continue
+        else:
+            chars.append(char)
+    result = ''.join(chars)
+    while '__' in result:
+        result = result.replace('__', '_')
+    result = result.strip('_')
+    if result.startswith('-'):
+        result = '_' + result[1:]
+    return result.lstrip('.') or '_'
+
+def read_download_archive(save_path):
+    """Đọc các mục ("extractor id") đã ghi trong archive của thư mục lưu"""
+    try:
+        with open(os.path.join(save_path, DOWNLOAD_ARCHIVE), 'r', encoding='utf-8') as f:
+            return {line.strip() for line in f if line.strip()}
+    except OSError:
+        return set()
+
+def in_playlist_ranges(index, ranges):
+    """Kiểm tra vị trí index có nằm trong các khoảng đã chọn không"""
+    if not ranges:
+        return True
+    return any(start <= index and (end is None or index <= end) for start, end in ranges)
+
+def format_playlist_items(indices):
+    """Gom danh sách vị trí đã sắp xếp thành chuỗi --playlist-items gọn (1-3,7,9-12)"""
+    parts = []
+    run_start = run_end = None
+    for index in indices:
+        if run_end is not None and index == run_end + 1:
+            run_end = index
+            continue
+        if run_start is not None:
+            parts.append(str(run_start) if run_start == run_end else f"{run_start}-{run_end}")
+        run_start = run_end = index
+    if run_start is not None:
+        parts.append(str(run_start) if run_start == run_end else f"{run_start}-{run_end}")
+    return ",".join(parts)
+
+class PlaylistEnumerator:
+    """Liệt kê các mục của playlist dạng stream (flat extraction, từng trang)
+
+    Mỗi dòng JSON yt-dlp in ra được chuyển ngay cho callback, không chờ
+    tải xong cả playlist.
+    """
+
+    def __init__(self, ytdlp_path, url, on_entry, on_done):
+        self.ytdlp_path = ytdlp_path
+        self.url = url
+        self.on_entry = on_entry
+        self.on_done = on_done
+        self.process = None
+        self.stopped = False
+
+    def start(self):
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def stop(self):
+        self.stopped = True
+        if self.process and self.process.poll() is None:
+            try:
+                self.process.terminate()
+            except Exception:
+                pass
+
+    def _run(self):
+        cmd = [
+            self.ytdlp_path,
+            '--flat-playlist',
+            '--lazy-playlist',
+            '--dump-json',
+            '--no-warnings',
+            self.url
+        ]
+        error = None
+        try:
+            self.process = subprocess.Popen(
+                cmd,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                text=True,
+                encoding='utf-8',
+                bufsize=1,
+                creationflags=subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0
+            )
+            count = 0
+            for line in self.process.stdout:
+                if self.stopped:
+                    break
+                line = line.strip()
+                if not line.startswith('{'):
+                    continue
+                try:
+                    info = json.loads(line)
+                except ValueError:
+                    continue
+                count += 1
+                # Chỉ giữ những trường cần hiển thị để bộ nhớ không phình theo JSON gốc
+                self.on_entry((
+                    info.get('playlist_index') or count,
+                    info.get('title') or info.get('id') or "",
+                    info.get('duration'),
+                    # Khoá giống dòng trong --download-archive
+                    f"{(info.get('ie_key') or '').lower()} {info.get('id') or ''}"
+                ))
+            self.process.wait()
+        except Exception as e:
+            error = e
+            event_log.error(f"Playlist enumeration error: {e}", url=self.url)
+        finally:
+            self.on_done(error)
+
+class PlaylistBrowser(ctk.CTkToplevel):
+    """Cửa sổ duyệt playlist: danh sách ảo hóa, chọn khoảng / lọc trước khi tải"""
+
+    VISIBLE_ROWS = 14
+
+    def __init__(self, app, url):
+        super().__init__(app)
+        self.app = app
+        self.url = url
+        self.lang = app.lang_manager
+
+        # Mỗi mục là tuple (index, title, duration, downloaded)
+        self.entries = []
+        # Vị trí (trong self.entries) của các mục khớp bộ lọc
+        self.view = []
+        self.entries_lock = threading.Lock()
+        self.ranges = []
+        self.filter_text = ""
+        self.offset = 0
+        self.loading = True
+        self.dirty = False
+
+        self.existing_names = self._scan_existing_names()
+        self.archived = read_download_archive(app.save_path)
+
+        self.title(self.lang.get_text("playlist_browser", "Playlist Browser"))
+        self.geometry("640x560")
+        self.create_widgets()
+        self.protocol("WM_DELETE_WINDOW", self.on_closing)
+
+        self.enumerator = PlaylistEnumerator(app.ytdlp_path, url, self._on_entry, self._on_done)
+        self.enumerator.start()
+        self.after(200, self._poll)
+
+    def _scan_existing_names(self):
+        """Lấy tên (không đuôi) các file đã có trong thư mục lưu để đánh dấu 'đã tải'"""
+        try:
+            return {os.path.splitext(f)[0].lower() for f in os.listdir(self.app.save_path)}
+        except Exception:
+            return set()
+
+    def create_widgets(self):
+        """Tạo giao diện"""
+        filter_frame = ctk.CTkFrame(self, fg_color="transparent")
+        filter_frame.pack(fill="x", padx=10, pady=(10, 5))
+
+        self.range_entry = ctk.CTkEntry(filter_frame, width=220,
+                                        placeholder_text=self.lang.get_text("playlist_range", "Items (e.g. 1-10,15,20-)"))
+        self.range_entry.pack(side="left", padx=5)
+        self.range_entry.bind("<KeyRelease>", self.apply_selection)
+
+        self.filter_entry = ctk.CTkEntry(filter_frame, width=300,
+                                         placeholder_text=self.lang.get_text("playlist_filter", "Filter by title..."))
+        self.filter_entry.pack(side="left", padx=5, fill="x", expand=True)
+        self.filter_entry.bind("<KeyRelease>", self.apply_selection)
+
+        # Danh sách ảo hóa: chỉ có VISIBLE_ROWS nhãn, nội dung đổi theo vị trí cuộn
+        list_frame = ctk.CTkFrame(self)
+        list_frame.pack(fill="both", expand=True, padx=10, pady=5)
+
+        rows_frame = ctk.CTkFrame(list_frame, fg_color="transparent")
+        rows_frame.pack(side="left", fill="both", expand=True)
+
+        self.row_labels = []
+        for _ in range(self.VISIBLE_ROWS):
+            label = ctk.CTkLabel(rows_frame, text="", anchor="w", font=("Arial", 11))
+            label.pack(fill="x", padx=8)
+            label.bind("<MouseWheel>", self._on_mousewheel)
+            label.bind("<Button-4>", self._on_mousewheel)
+            label.bind("<Button-5>", self._on_mousewheel)
+            self.row_labels.append(label)
+
+        self.scrollbar = ctk.CTkScrollbar(list_frame, command=self._on_scroll)
+        self.scrollbar.pack(side="right", fill="y")
+
+        for widget in (rows_frame, list_frame):
+            widget.bind("<MouseWheel>", self._on_mousewheel)
+            widget.bind("<Button-4>", self._on_mousewheel)
+            widget.bind("<Button-5>", self._on_mousewheel)
+
+        self.info_label = ctk.CTkLabel(self, text=self.lang.get_text("playlist_loading", "Loading playlist entries..."),
+                                       font=("Arial", 10), text_color="yellow")
+        self.info_label.pack(pady=2)
+
+        self.btn_download = ctk.CTkButton(self, text=self.lang.get_text("download_selected", "Download Selected"),
+                                          width=200, height=40,
+                                          fg_color="#1f6aa5", font=("Arial", 13, "bold"),
+                                          command=self.download_selected)
+        self.btn_download.pack(pady=10)
+
+    def _on_entry(self, entry):
+        """Callback từ thread liệt kê - chỉ cập nhật dữ liệu, việc vẽ do _poll đảm nhận"""
+        index, title, duration, archive_key = entry
+        downloaded = archive_key in self.archived or ytdlp_filename(title).lower() in self.existing_names
+        with self.entries_lock:
+            self.entries.append((index, title, duration, downloaded))
+            if self._matches_filter(title):
+                self.view.append(len(self.entries) - 1)
+            self.dirty = True
+
+    def _on_done(self, error):
+        # Đặt dirty trước để _poll luôn vẽ lại lần cuối trước khi dừng
+        self.dirty = True
+        self.loading = False
+
+    def _poll(self):
+        """Gộp các mục mới về luồng giao diện theo chu kỳ thay vì vẽ lại mỗi dòng"""
+        if not self.winfo_exists():
+            return
+        # Đọc loading trước dirty: nếu _on_done chạy xen giữa thì lần poll sau vẫn vẽ lại
+        loading = self.loading
+        if self.dirty:
+            self.dirty = False
+            self.render()
+        if loading:
+            self.after(200, self._poll)
+
+    def _matches_filter(self, title):
+        return not self.filter_text or self.filter_text in title.lower()
+
+    def apply_selection(self, event=None):
+        """Áp dụng lại khoảng chọn và bộ lọc tiêu đề"""
+        try:
+            self.ranges = parse_playlist_ranges(self.range_entry.get())
+            self.range_entry.configure(text_color=("black", "white"))
+        except ValueError:
+            self.range_entry.configure(text_color="red")
+            return
+
+        filter_text = self.filter_entry.get().strip().lower()
+        if filter_text != self.filter_text:
+            self.filter_text = filter_text
+            with self.entries_lock:
+                self.view = [i for i, entry in enumerate(self.entries) if self._matches_filter(entry[1])]
+            self.offset = 0
+        self.render()
+
+    def selected_indices(self):
+        """Vị trí playlist (1-based) của các mục vừa khớp bộ lọc vừa nằm trong khoảng chọn"""
+        with self.entries_lock:
+            return sorted(self.entries[i][0] for i in self.view
+                          if in_playlist_ranges(self.entries[i][0], self.ranges))
+
+    def render(self):
+        """Vẽ lại các dòng đang hiển thị"""
+        with self.entries_lock:
+            total = len(self.view)
+            self.offset = max(0, min(self.offset, total - self.VISIBLE_ROWS))
+            rows = [self.entries[i] for i in self.view[self.offset:self.offset + self.VISIBLE_ROWS]]
+            loaded = len(self.entries)
+
+        downloaded_text = self.lang.get_text("already_downloaded", "downloaded")
+        for i, label in enumerate(self.row_labels):
+            if i < len(rows):
+                index, title, duration, downloaded = rows[i]
+                mark = "☑" if in_playlist_ranges(index, self.ranges) else "☐"
+                text = f"{mark} {index}. {title} ({format_duration(duration)})"
+                if downloaded:
+                    text += f"  ✔ {downloaded_text}"
+                label.configure(text=text, text_color="gray" if downloaded else ("black", "white"))
+            else:
+                label.configure(text="")
+
+        if total:
+            self.scrollbar.set(self.offset / total, min(1.0, (self.offset + self.VISIBLE_ROWS) / total))
+        else:
+            self.scrollbar.set(0, 1)
+
+        selected = len(self.selected_indices())
+        info = self.lang.get_text("playlist_selected", "Selected: {} / {}").format(selected, loaded)
+        if self.loading:
+            info = f"{self.lang.get_text('playlist_loading', 'Loading playlist entries...')} {info}"
+        self.info_label.configure(text=info, text_color="yellow" if self.loading else "cyan")
+
+    def _on_scroll(self, action, value, unit=None):
+        """Xử lý lệnh từ thanh cuộn (moveto / scroll)"""
+        total = len(self.view)
+        if action == "moveto":
+            self.offset = int(float(value) * total)
+        elif action == "scroll":
+            step = self.VISIBLE_ROWS if unit == "pages" else 1
+            self.offset += int(value) * step
+        self.render()
+
+    def _on_mousewheel(self, event):
+        if getattr(event, "num", None) == 4 or getattr(event, "delta", 0) > 0:
+            self.offset -= 3
+        else:
+            self.offset += 3
+        self.render()
+
+    def download_selected(self):
+        """Chỉ chuyển các mục đã chọn sang bước tải"""
+        indices = self.selected_indices()
+        if not indices:
+            messagebox.showwarning(
+                self.lang.get_text("playlist_browser", "Playlist Browser"),
+                self.lang.get_text("playlist_no_selection", "No playlist items selected!"),
+                parent=self
+            )
+            return
+        self.app.start_thread(playlist_items=format_playlist_items(indices), url=self.url)
+        self.on_closing()
+
+    def on_closing(self):
+        self.enumerator.stop()
+        self.destroy()
+
+def low_priority_command(cmd):
+    """Command và tham số Popen để tiến trình phụ chạy với độ ưu tiên thấp (không tranh CPU với việc tải)"""
+    if os.name == 'nt':
+        return list(cmd), {'creationflags': subprocess.CREATE_NO_WINDOW | getattr(subprocess, 'BELOW_NORMAL_PRIORITY_CLASS', 0)}
+    if shutil.which('nice'):
+        return ['nice', '-n', '10'] + list(cmd), {}
+    return list(cmd), {}
+
+class IntegrityVerifier:
+    """Kiểm tra file sau khi tải bằng ffprobe/ffmpeg trong pool riêng
+
+    Pool có giới hạn số luồng riêng, tách biệt với các luồng tải, nên việc
+    kiểm tra không bao giờ chặn hay chiếm hết tài nguyên của việc tải.
+    """
+
+    # Sai lệch thời lượng cho phép so với thông tin từ yt-dlp
+    DURATION_TOLERANCE = 0.05
+    MIN_DURATION_TOLERANCE = 5.0
+    PROBE_TIMEOUT = 60
+    # Giải mã toàn bộ: tối đa gấp đôi thời lượng (+1 phút), hoặc 1 giờ nếu không biết thời lượng
+    MIN_DECODE_TIMEOUT = 120
+    DEFAULT_DECODE_TIMEOUT = 3600
+
+    def __init__(self, ffprobe_path, ffmpeg_path, max_workers=1):
+        self.ffprobe_path = ffprobe_path
+        self.ffmpeg_path = ffmpeg_path
+        self.executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="verify")
+        # Các tiến trình ffprobe/ffmpeg đang chạy, để shutdown() có thể kill
+        self.processes = set()
+        self.lock = threading.Lock()
+        self.closed = False
+
+    def submit(self, path, expected_duration, full_decode, callback):
+        """Đưa file vào hàng đợi kiểm tra, callback(path, ok, reason) khi xong"""
+        if self.closed:
+            return
+        future = self.executor.submit(self.verify_file, path, expected_duration, full_decode)
+
+        def done(f):
+            # Bị huỷ hoặc bị kill lúc đóng app: không có kết quả để báo
+            if f.cancelled() or self.closed:
+                return
+            callback(path, *f.result())
+
+        future.add_done_callback(done)
+
+    def verify_file(self, path, expected_duration=None, full_decode=False):
+        """Trả về (ok, reason)"""
+        try:
+            if not os.path.exists(path) or os.path.getsize(path) == 0:
+                return False, "missing or empty file"
+
+            ok, reason = self._probe(path, expected_duration)
+            if ok and full_decode:
+                ok, reason = self._decode(path, expected_duration)
+            return ok, reason
+        except Exception as e:
+            return False, str(e)
+
+    def _run(self, cmd, timeout):
+        """Chạy tiến trình phụ ưu tiên thấp, trả về (returncode, stdout, stderr)"""
+        cmd, kwargs = low_priority_command(cmd)
+        with self.lock:
+            if self.closed:
+                raise RuntimeError("verifier is shut down")
+            process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                       text=True, **kwargs)
+            self.processes.add(process)
+        try:
+            stdout, stderr = process.communicate(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.communicate()
+            raise
+        finally:
+            with self.lock:
+                self.processes.discard(process)
+        return process.returncode, stdout, stderr
+
+    def _probe(self, path, expected_duration):
+        """Kiểm tra nhanh container và thời lượng"""
+        returncode, stdout, stderr = self._run(
+            [self.ffprobe_path, '-v', 'error',
+             '-show_entries', 'format=duration:stream=codec_type',
+             '-of', 'json', path],
+            self.PROBE_TIMEOUT
+        )
+        if returncode != 0:
+            return False, f"ffprobe: {stderr.strip()[:200]}"
+
+        info = json.loads(stdout or "{}")
+        if not info.get('streams'):
+            return False, "no media streams"
+
+        try:
+            duration = float(info.get('format', {}).get('duration', 0))
+        except (TypeError, ValueError):
+            duration = 0
+        if duration <= 0:
+            return False, "invalid duration"
+
+        if expected_duration:
+            tolerance = max(self.MIN_DURATION_TOLERANCE, expected_duration * self.DURATION_TOLERANCE)
+            if abs(duration - expected_duration) > tolerance:
+                return False, f"duration {duration:.1f}s, expected {expected_duration:.1f}s"
+        return True, ""
+
+    def _decode(self, path, expected_duration=None):
+        """Giải mã toàn bộ file, báo lỗi ở frame hỏng đầu tiên"""
+        if expected_duration:
+            timeout = max(self.MIN_DECODE_TIMEOUT, expected_duration * 2 + 60)
+        else:
+            timeout = self.DEFAULT_DECODE_TIMEOUT
+        try:
+            returncode, _, stderr = self._run(
+                [self.ffmpeg_path, '-v', 'error', '-xerror', '-i', path, '-f', 'null', '-'],
+                timeout
+            )
+        except subprocess.TimeoutExpired:
+            return False, f"decode: timed out after {timeout:.0f}s"
+        if returncode != 0 or stderr.strip():
+            return False, f"decode: {stderr.strip()[:200]}"
+        return True, ""
+
+    def shutdown(self):
+        """Huỷ việc đang chờ và kill các tiến trình đang chạy để app thoát ngay"""
+        with self.lock:
+            self.closed = True
+            processes = list(self.processes)
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        for process in processes:
+            try:
+                process.kill()
+            except Exception:
+                pass
+
+def executable_name(name):
+    """Tên file thực thi theo hệ điều hành (thêm .exe trên Windows)"""
+    return f"{name}.exe" if os.name == 'nt' else name
+
+class ToolResolver:
+    """Tìm yt-dlp / ffmpeg / ffprobe trên mọi nền tảng và dò khả năng của chúng
+
+    Thứ tự tìm: đường dẫn cấu hình -> thư mục đi kèm (update/, thư mục app) -> PATH.
+    Kết quả dò (phiên bản, encoder, tăng tốc phần cứng...) được cache ra đĩa theo
+    đường dẫn + mtime của file thực thi, nên các lần mở app sau không phải dò lại.
+    """
+
+    TOOLS = ('yt-dlp', 'ffmpeg', 'ffprobe')
+
+    def __init__(self, overrides=None, bundled_dirs=("update", "."), cache_file=os.path.join("update", "tool_cache.json")):
+        self.overrides = overrides or {}
+        self.bundled_dirs = bundled_dirs
+        self.cache_file = cache_file
+        self.paths = {}
+        self.cache = self._load_cache()
+        self.lock = threading.Lock()
+        self.resolve_all()
+
+    def find(self, name):
+        """Tìm đường dẫn của một công cụ, trả về None nếu không thấy"""
+        override = self.overrides.get(name)
+        if override and os.path.isfile(override):
+            return override
+
+        for folder in self.bundled_dirs:
+            candidate = os.path.join(folder, executable_name(name))
+            if os.path.isfile(candidate):
+                return candidate
+
+        return shutil.which(name)
+
+    def resolve_all(self):
+        """Tìm lại tất cả công cụ (gọi sau khi cập nhật / đổi cấu hình)"""
+        self.paths = {name: self.find(name) for name in self.TOOLS}
+        return self.paths
+
+    def path(self, name):
+        return self.paths.get(name)
+
+    def capabilities(self, name):
+        """Khả năng của công cụ (dict), dò một lần rồi dùng lại từ cache"""
+        path = self.paths.get(name)
+        if not path:
+            return {}
+
+        with self.lock:
+            try:
+                key = f"{os.path.abspath(path)}|{os.path.getmtime(path)}"
+            except OSError:
+                return {}
+
+            if key in self.cache:
+                return self.cache[key]
+
+            try:
+                info = self._probe(name, path)
+            except Exception as e:
+                event_log.warning(f"Probe {name} failed: {e}", tool=name, path=path)
+                return {}
+
+            # Bỏ các bản ghi cũ của cùng file thực thi (mtime đã đổi sau khi cập nhật)
+            prefix = f"{os.path.abspath(path)}|"
+            self.cache = {k: v for k, v in self.cache.items() if not k.startswith(prefix)}
+            self.cache[key] = info
+            self._save_cache()
+            return info
+
+    def probe_all(self):
+        for name in self.TOOLS:
+            self.capabilities(name)
+
+    def has_encoder(self, encoder):
+        """True / False theo kết quả dò ffmpeg, None nếu chưa dò được (không kết luận gì)"""
+        encoders = self.capabilities('ffmpeg').get('encoders')
+        if not encoders:
+            return None
+        return encoder in encoders
+
+    def _run(self, cmd):
+        return subprocess.run(
+            cmd,
+            capture_output=True,
+            text=True,
+            creationflags=subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0,
+            timeout=15
+        ).stdout
+
+    def _probe(self, name, path):
+        if name == 'yt-dlp':
+            return {'version': self._run([path, '--version']).strip()}
+
+        version_output = self._run([path, '-hide_banner', '-version'])
+        first_line = version_output.splitlines()[0] if version_output else ""
+        version_match = re.match(r'\S+ version (\S+)', first_line)
+        info = {'version': version_match.group(1) if version_match else first_line}
+        if name != 'ffmpeg':
+            return info
+
+        # Các tính năng được bật khi build (--enable-libmp3lame, --enable-nvenc...)
+        info['features'] = re.findall(r'--enable-([\w-]+)', version_output)
+
+        # Danh sách encoder: " A....D libmp3lame  libmp3lame MP3 ..."
+        encoders = []
+        listing = False
+        for line in self._run([path, '-hide_banner', '-encoders']).splitlines():
+            if line.strip().startswith('------'):
+                listing = True
+                continue
+            parts = line.split()
+            if listing and len(parts) >= 2:
+                encoders.append(parts[1])
+        # Output rỗng / không đúng định dạng thì coi như chưa biết, không ghi danh sách rỗng vào cache
+        if encoders:
+            info['encoders'] = encoders
+
+        hwaccels = self._run([path, '-hide_banner', '-hwaccels']).splitlines()
+        info['hwaccels'] = [line.strip() for line in hwaccels[1:] if line.strip()]
+        return info
+
+    def _load_cache(self):
+        try:
+            if os.path.exists(self.cache_file):
+                with open(self.cache_file, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+        except Exception as e:
+            event_log.warning(f"Cannot load tool cache: {e}")
+        return {}
+
+    def _save_cache(self):
+        try:
+            with open(self.cache_file, 'w', encoding='utf-8') as f:
+                json.dump(self.cache, f, ensure_ascii=False, indent=2)
+        except Exception as e:
+            event_log.warning(f"Cannot save tool cache: {e}")
+
+RATE_UNITS = {'B': 1, 'KiB': 1024, 'MiB': 1024 ** 2, 'GiB': 1024 ** 3}
+
+def parse_rate(line):
+    """Lấy tốc độ (byte/giây) từ dòng progress của yt-dlp: '... at  3.20MiB/s ETA ...'"""
+    match = re.search(r'at\s+(\d+\.?\d*)(B|KiB|MiB|GiB)/s', line)
+    if not match:
+        return None
+    return float(match.group(1)) * RATE_UNITS[match.group(2)]
+
+class FragmentTuner:
+    """Chọn số fragment tải song song (-N) cho HLS/DASH theo từng host
+
+    yt-dlp cố định -N trong suốt một tiến trình, nên việc điều chỉnh diễn ra
+    giữa các lần tải: bắt đầu thấp, tăng gấp đôi khi tốc độ đo được còn cải
+    thiện, lùi lại khi bị giới hạn (429/403) hoặc tốc độ giảm. Giá trị tốt
+    nhất của mỗi host được lưu lại cho các lần chạy sau. Tổng số fragment
+    của các job đang chạy không vượt quá ngân sách chung.
+    """
+
+    START = 2
+    MAX = 16
+    # Tốc độ phải tăng ít nhất 10% mới coi là cải thiện, giảm quá 20% thì lùi lại
+    IMPROVE_RATIO = 1.1
+    DROP_RATIO = 0.8
+    # Sau bấy nhiêu lần tải thành công thì bỏ giới hạn trên đã học để thử tăng lại
+    CEILING_EXPIRY_RUNS = 10
+
+    def __init__(self, budget=16, state_file="fragment_tuning.json"):
+        self.budget = max(1, budget)
+        self.state_file = state_file
+        self.in_use = 0
+        self.lock = threading.Lock()
+        self.state = self._load_state()
+
+    @staticmethod
+    def key_for(url):
+        host = urlparse(url).netloc.lower()
+        return host[4:] if host.startswith("www.") else host
+
+    def acquire(self, key):
+        """Lấy số fragment cho job mới, giới hạn theo phần ngân sách còn lại"""
+        with self.lock:
+            wanted = self.state.get(key, {}).get('next', self.START)
+            granted = max(1, min(wanted, self.budget - self.in_use))
+            self.in_use += granted
+            return granted
+
+    def release(self, granted):
+        with self.lock:
+            self.in_use = max(0, self.in_use - granted)
+
+    def report(self, key, fragments, speed, throttled):
+        """Ghi nhận kết quả một job và chọn số fragment cho lần sau"""
+        with self.lock:
+            entry = self.state.setdefault(key, {'best': self.START, 'best_speed': 0, 'next': self.START})
+
+            if throttled:
+                entry['next'] = max(1, fragments // 2)
+                entry['best'] = min(entry['best'], entry['next'])
+                entry['best_speed'] = 0
+                self._set_ceiling(entry, fragments)
+                self._save_state()
+                return
+
+            if not speed or fragments != entry['next']:
+                # Không đo được, hoặc job bị ngân sách chung giới hạn: không dùng để điều chỉnh
+                return
+
+            # Giới hạn trên hết hạn sau một số lần chạy ổn định, để điều kiện mạng thay đổi vẫn được thử lại
+            if 'ceiling' in entry:
+                entry['ceiling_runs'] = entry.get('ceiling_runs', self.CEILING_EXPIRY_RUNS) - 1
+                if entry['ceiling_runs'] <= 0:
+                    entry.pop('ceiling', None)
+                    entry.pop('ceiling_runs', None)
+            ceiling = entry.get('ceiling', self.MAX * 2)
+
+            if fragments == entry['best']:
+                if entry['best_speed'] and speed < entry['best_speed'] * self.DROP_RATIO:
+                    # Tốc độ ở mức tốt nhất đang giảm: lùi một bậc và đo lại
+                    entry['best'] = entry['next'] = max(1, fragments // 2)
+                    entry['best_speed'] = 0
+                else:
+                    entry['best_speed'] = speed
+                    if fragments * 2 < ceiling:
+                        entry['next'] = min(self.MAX, fragments * 2)
+            elif speed > entry['best_speed'] * self.IMPROVE_RATIO:
+                entry['best'] = fragments
+                entry['best_speed'] = speed
+                if fragments * 2 < ceiling:
+                    entry['next'] = min(self.MAX, fragments * 2)
+            else:
+                # Tăng thêm không còn lợi: giữ mức tốt nhất, tạm thời không thử lại mức này
+                self._set_ceiling(entry, fragments)
+                entry['next'] = entry['best']
+
+            self._save_state()
+
+    def _set_ceiling(self, entry, fragments):
+        entry['ceiling'] = fragments
+        entry['ceiling_runs'] = self.CEILING_EXPIRY_RUNS
+
+    def _load_state(self):
+        try:
+            if os.path.exists(self.state_file):
+                with open(self.state_file, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+        except Exception as e:
+            event_log.warning(f"Cannot load fragment tuning: {e}")
+        return {}
+
+    def _save_state(self):
+        try:
+            with open(self.state_file, 'w', encoding='utf-8') as f:
+                json.dump(self.state, f, ensure_ascii=False, indent=2)
+        except Exception as e:
+            event_log.warning(f"Cannot save fragment tuning: {e}")
+
+class StagingManager:
+    """Thư mục tạm nhanh (SSD / tmpfs) cho việc tải và xử lý, chuyển file về đích ở nền
+
+    Việc chuyển file có pool riêng giới hạn số luồng; nếu thư mục tạm và thư mục
+    đích cùng filesystem thì chỉ cần đổi tên. Trước khi job bắt đầu, admit() giữ
+    chỗ theo dung lượng ước tính để thư mục tạm không bị đầy giữa chừng.
+    """
+
+    def __init__(self, staging_path="", max_workers=1):
+        self.staging_path = staging_path
+        self.executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="finalize")
+        self.reserved = 0
+        self.pending = 0
+        # Đường dẫn đích đã được các job trong phiên này nhận
+        self.claimed = set()
+        self.condition = threading.Condition()
+
+    @property
+    def enabled(self):
+        return bool(self.staging_path) and os.path.isdir(self.staging_path)
+
+    def free_space(self):
+        return shutil.disk_usage(self.staging_path).free
+
+    def admit(self, required, poll_interval=5):
+        """Giữ chỗ `required` byte; chờ các file đang chuyển giải phóng chỗ nếu cần
+
+        Trả về False nếu không đủ chỗ và cũng không còn gì sẽ giải phóng chỗ.
+        """
+        with self.condition:
+            while self.free_space() - self.reserved < required:
+                # Không còn file nào đang chuyển đi hay job nào đang tải vào: chờ cũng vô ích
+                if self.pending == 0 and self.reserved == 0:
+                    return False
+                self.condition.wait(timeout=poll_interval)
+            self.reserved += required
+            return True
+
+    def release(self, reserved):
+        with self.condition:
+            self.reserved = max(0, self.reserved - reserved)
+            self.condition.notify_all()
+
+    def finalize(self, source, dest_dir, callback):
+        """Chuyển file về dest_dir ở nền, callback(final_path, error) khi xong"""
+        with self.condition:
+            self.pending += 1
+        future = self.executor.submit(self._move, source, dest_dir)
+
+        def done(f):
+            with self.condition:
+                self.pending -= 1
+                self.condition.notify_all()
+            error = f.exception()
+            callback(None if error else f.result(), error)
+
+        future.add_done_callback(done)
+
+    def _claim_dest(self, dest_dir, name):
+        """Chọn tên đích cho file, trả về None nếu file cùng tên đã có từ trước
+
+        Giống yt-dlp khi tải thẳng vào thư mục lưu: file đã có sẵn thì giữ nguyên.
+        Chỉ khi hai job trong phiên này cho ra cùng tên mới đánh số "name (1).ext".
+        Tên đã nhận được giữ trong bộ nhớ, không tạo file giữ chỗ ở đích.
+        """
+        stem, ext = os.path.splitext(name)
+        counter = 0
+        with self.condition:
+            while True:
+                candidate = name if counter == 0 else f"{stem} ({counter}){ext}"
+                dest = os.path.join(dest_dir, candidate)
+                key = os.path.normcase(os.path.abspath(dest))
+                if key not in self.claimed:
+                    if not os.path.exists(dest):
+                        self.claimed.add(key)
+                        return dest
+                    if counter == 0:
+                        return None
+                counter += 1
+
+    def forget(self, path):
+        """Bỏ tên đã nhận (vd. file bị xoá để tải lại) để lần sau dùng lại đúng tên đó"""
+        with self.condition:
+            self.claimed.discard(os.path.normcase(os.path.abspath(path)))
+
+    @staticmethod
+    def _place(source, dest):
+        """Đặt source vào tên dest mà không ghi đè; False nếu dest đã bị chiếm"""
+        try:
+            # Hard link thất bại nếu dest đã tồn tại, không bao giờ ghi đè
+            os.link(source, dest)
+        except FileExistsError:
+            return False
+        except OSError:
+            # Filesystem không hỗ trợ hard link (FAT/exFAT...): đổi tên (Windows cũng không ghi đè)
+            if os.path.exists(dest):
+                return False
+            try:
+                os.rename(source, dest)
+            except FileExistsError:
+                return False
+            return True
+        os.remove(source)
+        return True
+
+    def _move(self, source, dest_dir):
+        os.makedirs(dest_dir, exist_ok=True)
+        name = os.path.basename(source)
+        same_filesystem = os.stat(source).st_dev == os.stat(dest_dir).st_dev
+
+        # Khác filesystem: copy sang file tạm ẩn, tên riêng ở đích; tên cuối chỉ xuất hiện khi đã copy xong
+        temp = source
+        if not same_filesystem:
+            fd, temp = tempfile.mkstemp(dir=dest_dir, prefix=".mmd_", suffix=".partial")
+            os.close(fd)
+            try:
+                shutil.copyfile(source, temp)
+                shutil.copystat(source, temp)
+            except Exception:
+                os.remove(temp)
+                raise
+
+        try:
+            while True:
+                dest = self._claim_dest(dest_dir, name)
+                if dest is None:
+                    # Đã có file cùng tên từ trước: bỏ bản vừa tải, giữ file cũ
+                    dest = os.path.join(dest_dir, name)
+                    event_log.info("File already exists, skipped", phase="finalize", path=dest)
+                    if temp != source:
+                        os.remove(temp)
+                    break
+                try:
+                    placed = self._place(temp, dest)
+                except Exception:
+                    self.forget(dest)
+                    raise
+                if placed:
+                    break
+                # Tên vừa bị tiến trình khác chiếm mất
+                self.forget(dest)
+        except Exception:
+            if temp != source:
+                try:
+                    os.remove(temp)
+                except OSError:
+                    pass
+            raise
+        if os.path.exists(source):
+            os.remove(source)
+        return dest
+
+    def shutdown(self):
+        # Không huỷ các file đang chuyển dở
+        self.executor.shutdown(wait=False)
+
+class LogViewer(ctk.CTkToplevel):
+    """Cửa sổ xem nhật ký sự kiện, lọc theo job và mức độ"""
+
+    ALL = "*"
+
+    def __init__(self, app):
+        super().__init__(app)
+        self.lang = app.lang_manager
+
+        self.title(self.lang.get_text("log_viewer", "Event Log"))
+        self.geometry("760x520")
+
+        filter_frame = ctk.CTkFrame(self, fg_color="transparent")
+        filter_frame.pack(fill="x", padx=10, pady=(10, 5))
+
+        ctk.CTkLabel(filter_frame, text=self.lang.get_text("log_job", "Job:")).pack(side="left", padx=5)
+        self.job_combo = ctk.CTkComboBox(filter_frame, values=[self.ALL], width=220, command=lambda _: self.refresh())
+        self.job_combo.set(self.ALL)
+        self.job_combo.pack(side="left", padx=5)
+        # Nhãn trong ô chọn -> (session, job)
+        self.job_choices = {}
+
+        ctk.CTkLabel(filter_frame, text=self.lang.get_text("log_level", "Level:")).pack(side="left", padx=5)
+        self.level_combo = ctk.CTkComboBox(filter_frame, values=list(EventLog.LEVELS), width=110,
+                                           command=lambda _: self.refresh())
+        self.level_combo.set("INFO")
+        self.level_combo.pack(side="left", padx=5)
+
+        self.btn_refresh = ctk.CTkButton(filter_frame, text=self.lang.get_text("refresh", "Refresh"),
+                                         width=100, command=self.refresh)
+        self.btn_refresh.pack(side="right", padx=5)
+
+        self.textbox = ctk.CTkTextbox(self, font=("Consolas", 11), wrap="none")
+        self.textbox.pack(fill="both", expand=True, padx=10, pady=(5, 10))
+
+        self.refresh()
+
+    @staticmethod
+    def job_label(session, job):
+        return f"#{job}  ({session})"
+
+    def refresh(self):
+        """Đọc lại nhật ký ở luồng nền (file có thể tới vài chục MB) rồi hiển thị"""
+        session, job = self.job_choices.get(self.job_combo.get(), (None, None))
+        min_level = EventLog.LEVELS.get(self.level_combo.get(), 0)
+        self.btn_refresh.configure(state="disabled")
+        threading.Thread(target=self._load, args=(session, job, min_level), daemon=True).start()
+
+    def _load(self, session, job, min_level):
+        records, jobs = event_log.read_records(session=session, job=job, min_level=min_level)
+        lines = []
+        for record in records:
+            prefix = f"#{record['job']} " if record.get('job') is not None else ""
+            phase = f"[{record['phase']}] " if record.get('phase') else ""
+            lines.append(f"{record.get('ts', '')} {record.get('level', ''):<7} {prefix}{phase}{record.get('msg', '')}")
+            for tail_line in record.get('stderr_tail') or []:
+                lines.append(f"    | {tail_line}")
+        # Phiên mới nhất lên đầu
+        ordered = sorted(jobs, key=lambda item: (item[0], item[1]), reverse=True)
+        try:
+            self.after(0, self._show, lines, ordered)
+        except (RuntimeError, TclError):
+            # Cửa sổ (hoặc app) đã đóng trong lúc đọc
+            pass
+
+    def _show(self, lines, jobs):
+        if not self.winfo_exists():
+            return
+        self.job_choices = {self.job_label(session, job): (session, job) for session, job in jobs}
+        self.job_combo.configure(values=[self.ALL] + list(self.job_choices))
+        self.btn_refresh.configure(state="normal")
+
+        self.textbox.configure(state="normal")
+        self.textbox.delete("1.0", "end")
+        self.textbox.insert("1.0", "\n".join(lines) if lines else self.lang.get_text("log_empty", "No events."))
+        self.textbox.configure(state="disabled")
+        self.textbox.see("end")
+
 class App(ctk.CTk):
     def __init__(self):
         super().__init__()
 
+        # File lưu cấu hình
+        self.config_file = "downloader_config.json"
+        config = self.load_config()
+
+        # Nhật ký sự kiện (cấu hình trước để các thành phần sau ghi đúng mức độ)
+        self.log_level = config.get('log_level', 'INFO')
+        self.log_max_bytes = config.get('log_max_bytes', 5 * 1024 * 1024)
+        self.log_backups = config.get('log_backups', 3)
+        event_log.configure(self.log_level, self.log_max_bytes, self.log_backups)
+
         # Khởi tạo Language Manager
         self.lang_manager = LanguageManager()
         
         # Khởi tạo Music Player
         self.music_player = MusicPlayer()
 
-        # File lưu cấu hình
-        self.config_file = "downloader_config.json"
-        config = self.load_config()
         self.save_path = config.get('save_path', os.path.join(os.path.expanduser("~"), "Downloads"))
         
         # Load ngôn ngữ từ config, fallback sang 'en' nếu không hợp lệ
@@ -174,15 +1410,44 @@ class App(ctk.CTk):
         self.music_player.volume = config.get('volume', 0.5)
         self.music_player.set_volume(self.music_player.volume)
 
+        # Chế độ nhanh: chỉ stream copy / remux, không encode lại
+        self.fast_mode_enabled = config.get('fast_mode', False)
+
+        # Kiểm tra file sau khi tải: "off" / "quick" (ffprobe) / "full" (giải mã toàn bộ)
+        self.verify_mode = config.get('verify_mode', 'off')
+        if self.verify_mode not in ('off', 'quick', 'full'):
+            self.verify_mode = 'off'
+        self.verify_workers = config.get('verify_workers', 1)
+
+        # Tổng số fragment HLS/DASH tải song song của tất cả job
+        self.fragment_budget = config.get('fragment_budget', 16)
+        self.fragment_tuner = FragmentTuner(self.fragment_budget)
+
+        # Thư mục tạm nhanh (để trống = tải thẳng vào save_path)
+        self.staging_path = config.get('staging_path', '')
+        self.finalize_workers = config.get('finalize_workers', 1)
+        self.staging = StagingManager(self.staging_path, self.finalize_workers)
+
         self.title(self.lang_manager.get_text("app_title", "Multimedia Downloader"))
         self.geometry("700x900")
 
-        # Đường dẫn yt-dlp
-        self.ytdlp_path = os.path.join("update", "yt-dlp.exe")
-        
         # Tạo thư mục update nếu chưa có
         os.makedirs("update", exist_ok=True)
 
+        # Tìm yt-dlp / ffmpeg / ffprobe (cấu hình -> update/ -> PATH)
+        self.tool_overrides = config.get('tool_paths', {})
+        self.resolver = ToolResolver(self.tool_overrides)
+        self.apply_tool_paths()
+
+        # Bản ghi các job tải (id -> dict)
+        self.jobs = {}
+        self.jobs_lock = threading.Lock()
+        self.job_counter = 0
+
+        self.verifier = IntegrityVerifier(self.ffprobe_path, self.ffmpeg_path, self.verify_workers)
+        # Tải lại file lỗi lần lượt từng cái một, chạy nền
+        self.retry_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="retry")
+
         # Biến để lưu danh sách file (cache)
         self.cached_files = []
         
@@ -191,6 +1456,16 @@ class App(ctk.CTk):
         # Auto update khi khởi động
         self.auto_update_on_start()
 
+    def apply_tool_paths(self):
+        """Cập nhật đường dẫn công cụ từ resolver"""
+        # Nếu chưa có yt-dlp thì _perform_update sẽ tải về update/
+        self.ytdlp_path = self.resolver.path('yt-dlp') or os.path.join("update", executable_name("yt-dlp"))
+        self.ffmpeg_path = self.resolver.path('ffmpeg')
+        self.ffprobe_path = self.resolver.path('ffprobe')
+        if hasattr(self, 'verifier'):
+            self.verifier.ffmpeg_path = self.ffmpeg_path
+            self.verifier.ffprobe_path = self.ffprobe_path
+
     def create_widgets(self):
         """Tạo giao diện"""
         # --- Header với ngôn ngữ, âm lượng và update ---
@@ -219,6 +1494,14 @@ class App(ctk.CTk):
                                         fg_color="#27ae60",
                                         command=self.manual_update)
         self.btn_update.pack(side="right", padx=10)
+
+        # Nút xem nhật ký
+        self.btn_logs = ctk.CTkButton(self.header_frame,
+                                      text=self.lang_manager.get_text("view_logs", "Logs"),
+                                      width=70, height=28,
+                                      fg_color="gray",
+                                      command=self.open_log_viewer)
+        self.btn_logs.pack(side="right")
         
         # Âm lượng
         volume_frame = ctk.CTkFrame(self.header_frame, fg_color="transparent")
@@ -251,8 +1534,17 @@ class App(ctk.CTk):
         self.url_entry.bind("<KeyRelease>", self.check_playlist)
 
         # --- Thông báo Playlist ---
-        self.playlist_notice_label = ctk.CTkLabel(self, text="", font=("Arial", 11), text_color="orange")
-        self.playlist_notice_label.pack(pady=2)
+        self.playlist_frame = ctk.CTkFrame(self, fg_color="transparent")
+        self.playlist_frame.pack(pady=2)
+
+        self.playlist_notice_label = ctk.CTkLabel(self.playlist_frame, text="", font=("Arial", 11), text_color="orange")
+        self.playlist_notice_label.pack(side="left")
+
+        # Nút mở trình duyệt playlist (chỉ hiện khi phát hiện playlist)
+        self.btn_browse_playlist = ctk.CTkButton(self.playlist_frame,
+                                                 text=self.lang_manager.get_text("browse_playlist", "Browse Playlist"),
+                                                 width=120, height=24,
+                                                 command=self.open_playlist_browser)
 
         # --- Nhập Tên File ---
         self.filename_entry = ctk.CTkEntry(self, width=600, 
@@ -283,6 +1575,24 @@ class App(ctk.CTk):
                                              variable=self.keep_original)
         self.keep_checkbox.pack(pady=5)
 
+        # --- Checkbox chế độ nhanh (không encode lại) ---
+        self.fast_mode = ctk.BooleanVar(value=self.fast_mode_enabled)
+        self.fast_checkbox = ctk.CTkCheckBox(self, 
+                                             text=self.lang_manager.get_text("fast_mode", "Fast mode (no re-encoding, keep original codec)"), 
+                                             variable=self.fast_mode,
+                                             command=self.fast_mode_changed)
+        self.fast_checkbox.pack(pady=5)
+
+        # --- Kiểm tra file sau khi tải ---
+        verify_frame = ctk.CTkFrame(self, fg_color="transparent")
+        verify_frame.pack(pady=5)
+        self.verify_text_label = ctk.CTkLabel(verify_frame, text=self.lang_manager.get_text("verify_files", "Verify files:"))
+        self.verify_text_label.pack(side="left", padx=5)
+        self.verify_menu = ctk.CTkOptionMenu(verify_frame, values=list(self.verify_mode_labels().values()),
+                                             width=160, command=self.verify_mode_changed)
+        self.verify_menu.set(self.verify_mode_labels()[self.verify_mode])
+        self.verify_menu.pack(side="left")
+
         # --- Chọn chất lượng ---
         self.quality_combo = ctk.CTkComboBox(self, values=["1080p", "720p", "480p", "360p"], width=200)
         self.quality_combo.set("1080p")
@@ -304,6 +1614,20 @@ class App(ctk.CTk):
                                         width=80, command=self.browse_path)
         self.btn_browse.pack(side="right", padx=10, pady=5)
 
+        # --- Thư mục tạm ---
+        self.staging_frame = ctk.CTkFrame(self)
+        self.staging_frame.pack(pady=(0, 10), padx=50, fill="x")
+        self.staging_label = ctk.CTkLabel(self.staging_frame, text=self.staging_label_text(), font=("Arial", 10))
+        self.staging_label.pack(side="left", padx=10)
+        self.btn_clear_staging = ctk.CTkButton(self.staging_frame,
+                                               text=self.lang_manager.get_text("clear", "Clear"),
+                                               width=60, fg_color="gray", command=self.clear_staging_path)
+        self.btn_clear_staging.pack(side="right", padx=(0, 10), pady=5)
+        self.btn_browse_staging = ctk.CTkButton(self.staging_frame,
+                                                text=self.lang_manager.get_text("change_path", "Change"),
+                                                width=80, command=self.browse_staging_path)
+        self.btn_browse_staging.pack(side="right", padx=10, pady=5)
+
         # --- Tiến trình ---
         self.status_label = ctk.CTkLabel(self, text=self.lang_manager.get_text("ready", "Ready"), 
                                         font=("Arial", 12), text_color="cyan")
@@ -313,6 +1637,9 @@ class App(ctk.CTk):
         self.progress_bar.set(0)
         self.progress_bar.pack(pady=10)
 
+        self.verify_label = ctk.CTkLabel(self, text="", font=("Arial", 10), text_color="gray")
+        self.verify_label.pack(pady=2)
+
         # --- Nút Bắt đầu ---
         self.btn_start = ctk.CTkButton(self, text=self.lang_manager.get_text("start_download", "START DOWNLOAD"), 
                                        width=200, height=45, 
@@ -367,7 +1694,7 @@ class App(ctk.CTk):
         try:
             # Lấy danh sách file với extension hợp lệ
             all_files = os.listdir(self.save_path)
-            files = [f for f in all_files if f.lower().endswith(('.mp4', '.mp3', '.webm', '.m4a'))]
+            files = [f for f in all_files if f.lower().endswith(MEDIA_EXTENSIONS)]
             
             if not files:
                 self.file_listbox.insert("1.0", self.lang_manager.get_text("no_files", "No downloaded files yet!"))
@@ -383,11 +1710,11 @@ class App(ctk.CTk):
                     self.file_listbox.insert("end", f"[{i}] {file} ({size:.2f} MB)\n")
                     self.cached_files.append(file)
                 except Exception as e:
-                    print(f"Error reading file {file}: {e}")
+                    event_log.warning(f"Error reading file {file}: {e}")
                     
         except Exception as e:
             self.file_listbox.insert("1.0", f"Error: {str(e)}")
-            print(f"Error refreshing file list: {e}")
+            event_log.error(f"Error refreshing file list: {e}")
 
     def open_download_folder(self):
         """Mở thư mục chứa file đã tải"""
@@ -398,7 +1725,7 @@ class App(ctk.CTk):
                 elif os.name == 'posix':  # macOS, Linux
                     subprocess.Popen(['xdg-open', self.save_path])
             except Exception as e:
-                print(f"Cannot open folder: {e}")
+                event_log.error(f"Cannot open folder: {e}")
                 messagebox.showerror("Error", f"Cannot open folder: {e}")
 
     def delete_selected_files(self):
@@ -416,7 +1743,7 @@ class App(ctk.CTk):
                         filename = match.group(1)
                         files_to_delete.append(filename)
                 except Exception as e:
-                    print(f"Error parsing line: {line}, Error: {e}")
+                    event_log.warning(f"Error parsing line: {line}, Error: {e}")
                     continue
         
         if not files_to_delete:
@@ -440,7 +1767,7 @@ class App(ctk.CTk):
                         os.remove(file_path)
                         deleted_count += 1
                 except Exception as e:
-                    print(f"Cannot delete {filename}: {e}")
+                    event_log.error(f"Cannot delete {filename}: {e}")
             
             messagebox.showinfo(
                 self.lang_manager.get_text("success", "Success"),
@@ -455,13 +1782,43 @@ class App(ctk.CTk):
             self.playlist_notice_label.configure(
                 text=self.lang_manager.get_text("playlist_detected", "Playlist detected! Will download entire playlist.")
             )
+            if not self.btn_browse_playlist.winfo_manager():
+                self.btn_browse_playlist.pack(side="left", padx=10)
         else:
             self.playlist_notice_label.configure(text="")
+            self.btn_browse_playlist.pack_forget()
+
+    def open_playlist_browser(self):
+        """Mở cửa sổ liệt kê và chọn mục playlist trước khi tải"""
+        url = self.url_entry.get().strip()
+        if not url:
+            return
+        PlaylistBrowser(self, url)
 
     def mode_changed(self):
         """Xử lý khi đổi chế độ tải"""
         self.size_estimate_label.configure(text="")
 
+    def verify_mode_labels(self):
+        """Tên hiển thị của các chế độ kiểm tra theo ngôn ngữ hiện tại"""
+        return {
+            'off': self.lang_manager.get_text("verify_off", "Off"),
+            'quick': self.lang_manager.get_text("verify_quick", "Quick check"),
+            'full': self.lang_manager.get_text("verify_full", "Full decode")
+        }
+
+    def verify_mode_changed(self, label):
+        """Lưu chế độ kiểm tra file"""
+        for mode, text in self.verify_mode_labels().items():
+            if text == label:
+                self.verify_mode = mode
+        self.save_config_data()
+
+    def fast_mode_changed(self):
+        """Lưu lựa chọn chế độ nhanh"""
+        self.fast_mode_enabled = self.fast_mode.get()
+        self.save_config_data()
+
     def update_all_texts(self):
         """Cập nhật toàn bộ text trong giao diện"""
         self.title(self.lang_manager.get_text("app_title", "Multimedia Downloader"))
@@ -471,11 +1828,21 @@ class App(ctk.CTk):
         self.video_radio.configure(text=self.lang_manager.get_text("video_mode", "Download Video (MP4)"))
         self.audio_radio.configure(text=self.lang_manager.get_text("audio_mode", "Download Audio (MP3)"))
         self.keep_checkbox.configure(text=self.lang_manager.get_text("keep_original", "Keep original file (.webm) after converting to MP3"))
+        self.fast_checkbox.configure(text=self.lang_manager.get_text("fast_mode", "Fast mode (no re-encoding, keep original codec)"))
+        self.verify_text_label.configure(text=self.lang_manager.get_text("verify_files", "Verify files:"))
+        self.verify_menu.configure(values=list(self.verify_mode_labels().values()))
+        self.verify_menu.set(self.verify_mode_labels()[self.verify_mode])
+        self.update_verify_label()
         self.path_label.configure(text=f"{self.lang_manager.get_text('save_location', 'Save to:')} {self.save_path}")
         self.btn_browse.configure(text=self.lang_manager.get_text("change_path", "Change"))
+        self.staging_label.configure(text=self.staging_label_text())
+        self.btn_browse_staging.configure(text=self.lang_manager.get_text("change_path", "Change"))
+        self.btn_clear_staging.configure(text=self.lang_manager.get_text("clear", "Clear"))
         self.status_label.configure(text=self.lang_manager.get_text("ready", "Ready"))
         self.btn_start.configure(text=self.lang_manager.get_text("start_download", "START DOWNLOAD"))
         self.btn_update.configure(text=self.lang_manager.get_text("update_system", "Update System"))
+        self.btn_logs.configure(text=self.lang_manager.get_text("view_logs", "Logs"))
+        self.btn_browse_playlist.configure(text=self.lang_manager.get_text("browse_playlist", "Browse Playlist"))
         
         #  header labels
         self.lang_label.configure(text=self.lang_manager.get_text("language", "Language:"))
@@ -490,6 +1857,10 @@ class App(ctk.CTk):
         # Refresh file list để cập nhật text trong listbox
         self.refresh_file_list()
 
+    def open_log_viewer(self):
+        """Mở cửa sổ xem nhật ký sự kiện"""
+        LogViewer(self)
+
     def change_language(self, lang_code):
         """Đổi ngôn ngữ ngay lập tức"""
         if self.lang_manager.set_language(lang_code):
@@ -526,10 +1897,18 @@ class App(ctk.CTk):
             if not os.path.exists(self.ytdlp_path):
                 try:
                     import urllib.request
-                    url = "https://github.com/yt-dlp/yt-dlp/releases/latest/download/yt-dlp.exe"
+                    if os.name == 'nt':
+                        asset = "yt-dlp.exe"
+                    elif sys.platform == 'darwin':
+                        asset = "yt-dlp_macos"
+                    else:
+                        asset = "yt-dlp"
+                    url = f"https://github.com/yt-dlp/yt-dlp/releases/latest/download/{asset}"
                     urllib.request.urlretrieve(url, self.ytdlp_path)
+                    if os.name != 'nt':
+                        os.chmod(self.ytdlp_path, 0o755)
                 except Exception as e:
-                    print(f"Download yt-dlp failed: {e}")
+                    event_log.error(f"Download yt-dlp failed: {e}", phase="update")
                     if not silent:
                         self.update_status_label.configure(
                             text=self.lang_manager.get_text("update_failed", "Update failed!"),
@@ -545,6 +1924,14 @@ class App(ctk.CTk):
                 creationflags=subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0,
                 timeout=30  # Timeout 30 giây
             )
+
+            event_log.info("yt-dlp update finished", phase="update",
+                           returncode=result.returncode, output=result.stdout.strip()[-500:])
+
+            # Tìm lại công cụ và dò khả năng (chỉ thực sự dò khi file thực thi đã thay đổi)
+            self.resolver.resolve_all()
+            self.apply_tool_paths()
+            self.resolver.probe_all()
             
             if not silent:
                 if result.returncode == 0:
@@ -561,14 +1948,14 @@ class App(ctk.CTk):
                 self.update_status_label.configure(text="", text_color="gray")
             
         except subprocess.TimeoutExpired:
-            print("Update timeout")
+            event_log.error("Update timeout", phase="update")
             if not silent:
                 self.update_status_label.configure(
                     text=self.lang_manager.get_text("update_failed", "Update failed!"),
                     text_color="red"
                 )
         except Exception as e:
-            print(f"Update error: {e}")
+            event_log.error(f"Update error: {e}", phase="update")
             if not silent:
                 self.update_status_label.configure(
                     text=self.lang_manager.get_text("update_failed", "Update failed!"),
@@ -583,7 +1970,17 @@ class App(ctk.CTk):
         default_config = {
             'save_path': os.path.join(os.path.expanduser("~"), "Downloads"),
             'language': 'en',
-            'volume': 0.5
+            'volume': 0.5,
+            'fast_mode': False,
+            'verify_mode': 'off',
+            'verify_workers': 1,
+            'tool_paths': {},
+            'fragment_budget': 16,
+            'staging_path': '',
+            'finalize_workers': 1,
+            'log_level': 'INFO',
+            'log_max_bytes': 5 * 1024 * 1024,
+            'log_backups': 3
         }
         
         try:
@@ -593,7 +1990,7 @@ class App(ctk.CTk):
                     # Merge với default config
                     default_config.update(loaded_config)
         except Exception as e:
-            print(f"Cannot load config: {e}")
+            event_log.error(f"Cannot load config: {e}")
         
         return default_config
 
@@ -603,12 +2000,22 @@ class App(ctk.CTk):
             config = {
                 'save_path': self.save_path,
                 'language': self.lang_manager.current_language,
-                'volume': self.music_player.volume
+                'volume': self.music_player.volume,
+                'fast_mode': self.fast_mode_enabled,
+                'verify_mode': self.verify_mode,
+                'verify_workers': self.verify_workers,
+                'tool_paths': self.tool_overrides,
+                'fragment_budget': self.fragment_budget,
+                'staging_path': self.staging_path,
+                'finalize_workers': self.finalize_workers,
+                'log_level': self.log_level,
+                'log_max_bytes': self.log_max_bytes,
+                'log_backups': self.log_backups
             }
             with open(self.config_file, 'w', encoding='utf-8') as f:
                 json.dump(config, f, ensure_ascii=False, indent=2)
         except Exception as e:
-            print(f"Cannot save config: {e}")
+            event_log.error(f"Cannot save config: {e}")
 
     def browse_path(self):
         """Chọn thư mục lưu file"""
@@ -621,6 +2028,26 @@ class App(ctk.CTk):
             self.save_config_data()
             self.refresh_file_list()
 
+    def staging_label_text(self):
+        staging = self.staging_path or self.lang_manager.get_text("staging_off", "Off (download directly)")
+        return f"{self.lang_manager.get_text('staging_location', 'Staging folder:')} {staging}"
+
+    def browse_staging_path(self):
+        """Chọn thư mục tạm (SSD / tmpfs)"""
+        path = filedialog.askdirectory()
+        if path:
+            self.set_staging_path(path)
+
+    def clear_staging_path(self):
+        """Tắt thư mục tạm, tải thẳng vào save_path"""
+        self.set_staging_path('')
+
+    def set_staging_path(self, path):
+        self.staging_path = path
+        self.staging.staging_path = path
+        self.staging_label.configure(text=self.staging_label_text())
+        self.save_config_data()
+
     def estimate_file_size(self, url):
         """Ước tính dung lượng file"""
         try:
@@ -660,13 +2087,18 @@ class App(ctk.CTk):
         except subprocess.TimeoutExpired:
             self.size_estimate_label.configure(text="", text_color="gray")
         except Exception as e:
-            print(f"Estimate error: {e}")
+            event_log.warning(f"Estimate error: {e}")
             self.size_estimate_label.configure(text="", text_color="gray")
 
-    def start_thread(self):
-        """Bắt đầu tải (thread)"""
+    def start_thread(self, playlist_items=None, url=None):
+        """Bắt đầu tải (thread)
+
+        playlist_items: chuỗi --playlist-items (vd. "1-10,15") khi chỉ tải một phần playlist
+        url: link cần tải, mặc định lấy từ ô nhập link
+        """
         self.progress_bar.set(0)
-        url = self.url_entry.get().strip()
+        if url is None:
+            url = self.url_entry.get().strip()
         
         if not url:
             self.status_label.configure(
@@ -675,63 +2107,196 @@ class App(ctk.CTk):
             )
             return
 
-        # Estimate size trong thread riêng
-        threading.Thread(target=self.estimate_file_size, args=(url,), daemon=True).start()
+        # Estimate size trong thread riêng (bỏ qua khi tải mục đã chọn từ playlist)
+        if playlist_items is None:
+            threading.Thread(target=self.estimate_file_size, args=(url,), daemon=True).start()
         
         # Start download
-        thread = threading.Thread(target=self.download_process, args=(url,), daemon=True)
+        thread = threading.Thread(target=self.download_process, args=(url, playlist_items), daemon=True)
         thread.start()
 
-    def download_process(self, url):
-        """Xử lý tải xuống"""
-        self.btn_start.configure(state="disabled")
-        
+    def create_job(self, url, playlist_items=None):
+        """Tạo bản ghi job, chụp lại toàn bộ tùy chọn hiện tại trên giao diện
+
+        Nhờ vậy việc tải lại (khi kiểm tra file thất bại) dùng đúng cấu hình cũ.
+        """
         custom_name = self.filename_entry.get().strip()
         # Sanitize filename - loại bỏ ký tự không hợp lệ
         custom_name = re.sub(r'[\\/*?:"<>|]', "", custom_name)
-        quality = self.quality_combo.get().replace("p", "")
-        mode = self.download_mode.get()
+
+        with self.jobs_lock:
+            self.job_counter += 1
+            job = {
+                'id': self.job_counter,
+                'url': url,
+                'playlist_items': playlist_items,
+                'custom_name': custom_name,
+                'quality': self.quality_combo.get().replace("p", ""),
+                'mode': self.download_mode.get(),
+                'fast_mode': self.fast_mode.get(),
+                'keep_original': self.keep_original.get(),
+                'save_path': self.save_path,
+                'attempt': 0,
+                # Job do người dùng bấm tải: được cập nhật nút Start / thanh tiến trình
+                'interactive': True,
+                'status': 'pending',
+                'files': [],
+                # path -> "ok" / "pending" / lý do lỗi
+                'verification': {}
+            }
+            self.jobs[job['id']] = job
+        return job
+
+    def retry_job(self, job, url):
+        """Tạo job tải lại một mục (dùng lại tùy chọn của job gốc)"""
+        with self.jobs_lock:
+            self.job_counter += 1
+            retry = dict(job, id=self.job_counter, url=url, playlist_items=None,
+                         attempt=job['attempt'] + 1, interactive=False, status='pending',
+                         files=[], verification={})
+            self.jobs[retry['id']] = retry
+        return retry
+
+    def build_download_command(self, job, print_file):
+        """Xây dựng command cho yt-dlp từ bản ghi job"""
+        url = job['url']
+        quality = job['quality']
 
         # Tên file output
-        output_template = os.path.join(self.save_path, f"{custom_name if custom_name else '%(title)s'}.%(ext)s")
+        output_template = os.path.join(job.get('work_dir') or job['save_path'], f"{job['custom_name'] if job['custom_name'] else '%(title)s'}.%(ext)s")
 
-        # Xây dựng command cho yt-dlp
         cmd = [
             self.ytdlp_path,
             url,
             '-o', output_template,
-            '--ffmpeg-location', './ffmpeg.exe',
             '--no-warnings',
-            '--newline'
+            '--newline',
+            # Ghi lại thời lượng, link và đường dẫn cuối cùng của từng file để kiểm tra sau khi tải
+            '--print-to-file', 'after_move:%(duration|)s\t%(webpage_url)s\t%(filepath)s', print_file,
+            # Số fragment HLS/DASH tải song song (chỉ có tác dụng với stream phân đoạn)
+            '--concurrent-fragments', str(job.get('fragments', 1))
         ]
+        if self.ffmpeg_path:
+            cmd.extend(['--ffmpeg-location', self.ffmpeg_path])
 
-        # Tự động tải toàn bộ playlist
-        if "playlist" in url.lower() or "list=" in url:
+        # Chỉ tải các mục đã chọn, hoặc tự động tải toàn bộ playlist
+        playlist = bool(job['playlist_items']) or "playlist" in url.lower() or "list=" in url
+        if job['playlist_items']:
+            cmd.extend(['--yes-playlist', '--playlist-items', job['playlist_items']])
+        elif playlist:
             cmd.extend(['--yes-playlist'])
+
+        # Tải vào thư mục tạm thì yt-dlp không thấy file đã có ở thư mục lưu, nên playlist
+        # dùng archive đặt cạnh đó để bỏ qua mục đã tải; lần tải lại file lỗi thì không
+        if playlist and job.get('work_dir') and job['attempt'] == 0:
+            cmd.extend(['--download-archive', os.path.join(job['save_path'], DOWNLOAD_ARCHIVE)])
+
+        # Không có ffmpeg: chỉ tải được stream đơn, không merge / chuyển đổi
+        if not self.ffmpeg_path:
+            if job['mode'] == "audio":
+                cmd.extend(['-f', 'bestaudio[ext=m4a]/bestaudio/best'])
+            else:
+                cmd.extend(['-f', f'best[height<={quality}][ext=mp4]/best[height<={quality}]/best'])
+            return cmd
+
+        # Chỉ khi dò được ffmpeg và chắc chắn thiếu encoder MP3 mới giữ nguyên codec gốc
+        fast_mode = job['fast_mode'] or (job['mode'] == "audio" and self.resolver.has_encoder('libmp3lame') is False)
         
         # Cấu hình theo chế độ
-        if mode == "audio":
-            cmd.extend([
-                '-f', 'bestaudio/best',
-                '-x',
-                '--audio-format', 'mp3',
-                '--audio-quality', '192K'
-            ])
+        if job['mode'] == "audio":
+            if fast_mode:
+                # Giữ nguyên m4a/opus, -x chỉ tách audio bằng stream copy
+                cmd.extend([
+                    '-f', 'bestaudio[ext=m4a]/bestaudio[acodec=opus]/bestaudio/best',
+                    '-x'
+                ])
+            else:
+                cmd.extend([
+                    '-f', 'bestaudio/best',
+                    '-x',
+                    '--audio-format', 'mp3',
+                    '--audio-quality', '192K'
+                ])
             
             # Giữ file gốc .webm nếu được chọn
-            if self.keep_original.get():
+            if job['keep_original']:
                 cmd.append('--keep-video')
+        elif fast_mode:
+            # Ưu tiên cặp mp4/m4a (chỉ cần remux) để không mất độ phân giải - stream progressive
+            # thường chỉ có 360p; nếu codec không vừa MP4 thì ghép sang MKV thay vì encode lại
+            cmd.extend([
+                '-f', f'bestvideo[height<={quality}][ext=mp4]+bestaudio[ext=m4a]/best[height<={quality}][ext=mp4]/bestvideo[height<={quality}]+bestaudio/best',
+                '--merge-output-format', 'mp4/mkv'
+            ])
         else:
             cmd.extend([
                 '-f', f'bestvideo[height<={quality}][ext=mp4]+bestaudio[ext=m4a]/best[height<={quality}][ext=mp4]/best',
                 '--merge-output-format', 'mp4'
             ])
 
+        return cmd
+
+    def download_process(self, url, playlist_items=None, job=None):
+        """Xử lý tải xuống"""
+        if job is None:
+            job = self.create_job(url, playlist_items)
+        if job['interactive']:
+            self.btn_start.configure(state="disabled")
+        started = time.monotonic()
+        event_log.info("Job started", job=job['id'], phase="queued", url=job['url'],
+                       playlist_items=job['playlist_items'], mode=job['mode'], quality=job['quality'],
+                       fast_mode=job['fast_mode'], attempt=job['attempt'])
+
+        # Tải và xử lý trong thư mục tạm riêng của job, chuyển sang save_path sau
+        job['work_dir'] = None
+        reserved = 0
+        if self.staging.enabled:
+            # Thư mục mới, tên duy nhất: không bao giờ dùng lại thư mục sót lại từ phiên trước
+            job['work_dir'] = tempfile.mkdtemp(dir=self.staging.staging_path, prefix=f"job_{job['id']}_")
+            event_log.debug("Waiting for staging space", job=job['id'], phase="admission")
+            reserved = self.admit_job(job)
+            if reserved is None:
+                job['status'] = 'failed'
+                event_log.error("Not enough free space in staging folder", job=job['id'], phase="admission",
+                                staging_path=self.staging.staging_path)
+                shutil.rmtree(job['work_dir'], ignore_errors=True)
+                self.show_job_status(
+                    job, self.lang_manager.get_text("error_no_space", "ERROR: Not enough free space in staging folder!"),
+                    "#e74c3c"
+                )
+                if job['interactive']:
+                    self.btn_start.configure(state="normal")
+                return
+
+        fd, print_file = tempfile.mkstemp(prefix="mmd_files_", suffix=".txt")
+        os.close(fd)
+        tuning_key = self.fragment_tuner.key_for(job['url'])
+        job['fragments'] = self.fragment_tuner.acquire(tuning_key)
+        cmd = self.build_download_command(job, print_file)
+        job['status'] = 'downloading'
+        event_log.info("Download started", job=job['id'], phase="download",
+                       fragments=job['fragments'], work_dir=job['work_dir'])
+        event_log.debug("yt-dlp command", job=job['id'], phase="download", cmd=cmd)
+
+        # Số liệu để điều chỉnh số fragment cho lần sau
+        speeds = []
+        fragmented = False
+        throttled = False
+        success = False
+        postprocessing = False
+        stderr_tail = deque(maxlen=STDERR_TAIL_LINES)
+
+        # Chuyển / kiểm tra từng file ngay khi yt-dlp ghi xong, không chờ cả playlist
+        job['handled'] = set()
+        job['finalizing'] = 0
+        job['closed'] = False
+        job['lock'] = threading.Lock()
+        stop_watching = threading.Event()
+        watcher = threading.Thread(target=self.watch_job_files, args=(job, print_file, stop_watching), daemon=True)
+        watcher.start()
+
         try:
-            self.status_label.configure(
-                text=self.lang_manager.get_text("downloading", "Downloading:") + " 0%",
-                text_color="yellow"
-            )
+            self.show_job_status(job, self.lang_manager.get_text("downloading", "Downloading:") + " 0%", "yellow")
             
             # Chạy yt-dlp
             process = subprocess.Popen(
@@ -742,60 +2307,357 @@ class App(ctk.CTk):
                 bufsize=1,  # Line buffered
                 creationflags=subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0
             )
+
+            # Đọc stderr ở luồng riêng để pipe không bị đầy, chỉ giữ lại vài dòng cuối
+            stderr_thread = threading.Thread(
+                target=lambda: stderr_tail.extend(line.rstrip() for line in process.stderr),
+                daemon=True
+            )
+            stderr_thread.start()
             
             # Đọc output để cập nhật progress
             for line in process.stdout:
                 line = line.strip()
+                if '(frag ' in line:
+                    fragmented = True
+                # 429 luôn là bị giới hạn; 403 chỉ tính khi xảy ra lúc tải lại fragment
+                # (403 khác thường là chữ ký hết hạn, chặn vùng, video riêng tư...)
+                if 'HTTP Error 429' in line or ('HTTP Error 403' in line and 'fragment' in line.lower()):
+                    throttled = True
                 if '[download]' in line and '%' in line:
+                    rate = parse_rate(line)
+                    if rate:
+                        speeds.append(rate)
                     try:
                         # Extract percentage
                         percent_match = re.search(r'(\d+\.?\d*)%', line)
                         if percent_match:
                             percent_str = percent_match.group(1)
                             percent = float(percent_str) / 100
-                            self.progress_bar.set(percent)
-                            self.status_label.configure(
-                                text=f"{self.lang_manager.get_text('downloading', 'Downloading:')} {percent_str}%",
-                                text_color="yellow"
+                            self.show_job_progress(job, percent)
+                            self.show_job_status(
+                                job, f"{self.lang_manager.get_text('downloading', 'Downloading:')} {percent_str}%",
+                                "yellow"
                             )
                     except Exception as e:
-                        print(f"Parse progress error: {e}")
+                        event_log.debug(f"Parse progress error: {e}", job=job['id'], phase="download")
                 elif 'Merging' in line or 'ExtractAudio' in line or 'Fixing' in line:
-                    self.status_label.configure(
-                        text=self.lang_manager.get_text("converting", "Converting format... Please wait!"),
-                        text_color="orange"
+                    if not postprocessing:
+                        postprocessing = True
+                        event_log.info("Post-processing", job=job['id'], phase="postprocess", step=line[:200])
+                    self.show_job_status(
+                        job, self.lang_manager.get_text("converting", "Converting format... Please wait!"),
+                        "orange"
                     )
             
             process.wait()
+            stderr_thread.join(timeout=5)
             
             if process.returncode == 0:
-                self.status_label.configure(
-                    text=self.lang_manager.get_text("success", "SUCCESS!"),
-                    text_color="#2ecc71"
-                )
-                self.progress_bar.set(1)
+                success = True
+                job['status'] = 'finalizing' if job['work_dir'] else 'done'
+                self.show_job_status(job, self.lang_manager.get_text("success", "SUCCESS!"), "#2ecc71")
+                self.show_job_progress(job, 1)
                 self.refresh_file_list()
             else:
-                error_output = process.stderr.read() if process.stderr else ""
-                self.status_label.configure(
-                    text=self.lang_manager.get_text("error_download", "ERROR: Cannot download! Check link"),
-                    text_color="#e74c3c"
+                job['status'] = 'failed'
+                error_output = "\n".join(stderr_tail)
+                if 'HTTP Error 429' in error_output:
+                    throttled = True
+                self.show_job_status(
+                    job, self.lang_manager.get_text("error_download", "ERROR: Cannot download! Check link"),
+                    "#e74c3c"
                 )
-                print(f"Download error: {error_output}")
+                event_log.error("Download failed", job=job['id'], phase="download",
+                                returncode=process.returncode, stderr_tail=list(stderr_tail))
             
         except Exception as e:
-            self.status_label.configure(
-                text=f"ERROR: {str(e)[:50]}",
-                text_color="#e74c3c"
-            )
-            print(f"Download exception: {e}")
+            job['status'] = 'failed'
+            self.show_job_status(job, f"ERROR: {str(e)[:50]}", "#e74c3c")
+            event_log.error(f"Download exception: {e}", job=job['id'], phase="download",
+                            stderr_tail=list(stderr_tail))
         
         finally:
-            self.btn_start.configure(state="normal")
+            self.fragment_tuner.release(job['fragments'])
+            # Chỉ job thực sự tải fragment mới dùng để điều chỉnh
+            if fragmented:
+                average_speed = sum(speeds) / len(speeds) if speeds else None
+                self.fragment_tuner.report(tuning_key, job['fragments'], average_speed, throttled)
+            self.staging.release(reserved)
+            event_log.info("Download finished", job=job['id'], phase="download", status=job['status'],
+                           elapsed=round(time.monotonic() - started, 3), fragments=job['fragments'],
+                           fragmented=fragmented, throttled=throttled,
+                           avg_speed=round(sum(speeds) / len(speeds)) if speeds else None)
+            # Kể cả khi thất bại, các file đã hoàn tất (vd. một phần playlist) vẫn được giữ lại
+            stop_watching.set()
+            watcher.join()
+            self.close_job_files(job, success)
+            try:
+                os.remove(print_file)
+            except OSError:
+                pass
+            if job['interactive']:
+                self.btn_start.configure(state="normal")
+
+    def show_job_status(self, job, text, text_color):
+        """Cập nhật dòng trạng thái chung (bỏ qua với job tải lại chạy nền)"""
+        if job['interactive']:
+            self.status_label.configure(text=text, text_color=text_color)
+
+    def show_job_progress(self, job, value):
+        """Cập nhật thanh tiến trình chung (bỏ qua với job tải lại chạy nền)"""
+        if job['interactive']:
+            self.progress_bar.set(value)
+
+    def admit_job(self, job):
+        """Kiểm tra dung lượng trống của thư mục tạm trước khi cho job bắt đầu
+
+        Trả về số byte đã giữ chỗ, hoặc None nếu không đủ chỗ.
+        """
+        estimate = self.estimate_job_size(job)
+        if not estimate:
+            event_log.warning("Cannot estimate job size, starting without staging space check",
+                              job=job['id'], phase="admission")
+            return 0
+
+        # Merge / chuyển đổi cần chỗ cho cả file nguồn lẫn file kết quả
+        required = int(estimate * STAGING_HEADROOM)
+        self.show_job_status(
+            job, self.lang_manager.get_text("waiting_space", "Waiting for free space in staging folder..."),
+            "orange"
+        )
+        if self.staging.admit(required):
+            return required
+        return None
+
+    def estimate_job_size(self, job):
+        """Ước tính tổng dung lượng các định dạng sẽ tải (byte), 0 nếu không biết
+
+        Chỉ mô phỏng vài mục đầu rồi nhân theo số mục cần tải, nên playlist
+        dài không phải trích xuất hết từng mục.
+        """
+        cmd = self.build_download_command(job, os.devnull)
+        cmd.extend(['--simulate', '--print', '%(playlist_count|)s\t%(filesize,filesize_approx|0)s'])
+        try:
+            process = subprocess.Popen(
+                cmd,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                text=True,
+                creationflags=subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0
+            )
+        except Exception as e:
+            event_log.warning(f"Estimate job size error: {e}", job=job['id'], phase="admission")
+            return 0
+
+        sizes = []
+        playlist_count = None
+        # Quá thời gian thì dừng yt-dlp và dùng các mục đã có
+        timer = threading.Timer(STAGING_ESTIMATE_TIMEOUT, process.kill)
+        timer.start()
+        try:
+            for line in process.stdout:
+                count, _, size = line.strip().rpartition('\t')
+                try:
+                    sizes.append(float(size))
+                except ValueError:
+                    continue
+                if count.isdigit():
+                    playlist_count = int(count)
+                if len(sizes) >= STAGING_ESTIMATE_SAMPLE:
+                    break
+        finally:
+            timer.cancel()
+            if process.poll() is None:
+                process.kill()
+            process.stdout.close()
+            process.wait()
+
+        if not sizes:
+            return 0
+        items = self.count_job_items(job, playlist_count) or len(sizes)
+        return sum(sizes) / len(sizes) * max(items, len(sizes))
+
+    def count_job_items(self, job, playlist_count):
+        """Số mục job sẽ tải, None nếu không biết"""
+        if not job['playlist_items']:
+            return playlist_count or 1
+        try:
+            ranges = parse_playlist_ranges(job['playlist_items'])
+        except ValueError:
+            return None
+        total = 0
+        for start, end in ranges:
+            if playlist_count:
+                end = min(end or playlist_count, playlist_count)
+            if end is None:
+                return None
+            total += max(0, end - start + 1)
+        return total
+
+    def read_job_files(self, print_file, offset=0):
+        """Đọc các dòng (thời lượng, link, đường dẫn) yt-dlp đã ghi xong từ vị trí offset
+
+        Trả về (entries, offset mới); dòng đang ghi dở được để lại cho lần đọc sau.
+        """
+        entries = []
+        try:
+            with open(print_file, 'rb') as f:
+                f.seek(offset)
+                data = f.read()
+        except OSError as e:
+            event_log.error(f"Cannot read downloaded file list: {e}")
+            return entries, offset
+
+        end = data.rfind(b'\n') + 1
+        for line in data[:end].decode('utf-8', errors='replace').splitlines():
+            duration, webpage_url, path = (line.split('\t', 2) + ["", ""])[:3]
+            if not path:
+                continue
+            try:
+                expected_duration = float(duration) if duration else None
+            except ValueError:
+                expected_duration = None
+            entries.append((expected_duration, webpage_url, path))
+        return entries, offset + end
+
+    def watch_job_files(self, job, print_file, stop, interval=0.5):
+        """Theo dõi file --print-to-file trong lúc yt-dlp chạy, xử lý từng file vừa hoàn tất"""
+        offset = 0
+        while True:
+            stopping = stop.wait(interval)
+            entries, offset = self.read_job_files(print_file, offset)
+            for entry in entries:
+                self.handle_job_file(job, *entry)
+            if stopping:
+                return
+
+    def handle_job_file(self, job, expected_duration, webpage_url, path):
+        """Chuyển file từ thư mục tạm (nếu có) rồi đẩy sang pool kiểm tra, không chờ kết quả"""
+        work_dir = job.get('work_dir')
+        if not work_dir:
+            job['files'].append(path)
+            self.submit_verification(job, path, expected_duration, webpage_url)
+            return
+
+        name = os.path.basename(path)
+        with job['lock']:
+            if name in job['handled']:
+                return
+            job['handled'].add(name)
+            job['finalizing'] += 1
+        self.staging.finalize(
+            os.path.join(work_dir, name), job['save_path'],
+            lambda final_path, error: self._on_file_finalized(job, name, final_path, error,
+                                                              expected_duration, webpage_url)
+        )
+
+    def _on_file_finalized(self, job, name, final_path, error, expected_duration, webpage_url):
+        if error:
+            event_log.error(f"Finalize {name} failed: {error}", job=job['id'], phase="finalize")
+        else:
+            event_log.debug("File finalized", job=job['id'], phase="finalize", path=final_path)
+            job['files'].append(final_path)
+            # Chỉ file kết quả có trong danh sách của yt-dlp mới có thông tin để kiểm tra
+            if webpage_url:
+                self.submit_verification(job, final_path, expected_duration, webpage_url)
+        with job['lock']:
+            job['finalizing'] -= 1
+            done = job['closed'] and job['finalizing'] == 0
+        if done:
+            self.complete_staged_job(job)
+
+    def close_job_files(self, job, success):
+        """Gọi khi yt-dlp đã thoát: chuyển nốt các file còn lại trong thư mục tạm"""
+        work_dir = job.get('work_dir')
+        if not work_dir:
+            return
+
+        if success:
+            # Lấy mọi file kết quả (kể cả file gốc khi chọn giữ lại), bỏ qua file dở dang
+            try:
+                names = [name for name in os.listdir(work_dir)
+                         if not name.endswith(STAGING_PARTIAL_SUFFIXES) and '.part-Frag' not in name]
+            except OSError:
+                names = []
+            for name in names:
+                self.handle_job_file(job, None, "", os.path.join(work_dir, name))
+
+        with job['lock']:
+            job['closed'] = True
+            done = job['finalizing'] == 0
+        if done:
+            self.complete_staged_job(job)
+
+    def complete_staged_job(self, job):
+        """Mọi file của job đã được chuyển: dọn thư mục tạm"""
+        # Dọn file dở dang còn lại trong thư mục tạm của job
+        shutil.rmtree(job['work_dir'], ignore_errors=True)
+        if job['status'] == 'finalizing':
+            job['status'] = 'done'
+        event_log.info("Finalization finished", job=job['id'], phase="finalize", files=len(job['handled']))
+        self.refresh_file_list()
+
+    def submit_verification(self, job, path, expected_duration, url):
+        """Đẩy một file sang pool kiểm tra (nếu bật)"""
+        if self.verify_mode == "off" or not self.ffprobe_path:
+            return
+        # update_verify_label đọc dict này từ luồng khác dưới jobs_lock
+        with self.jobs_lock:
+            job['verification'][path] = 'pending'
+        self.verifier.submit(
+            path, expected_duration, self.verify_mode == "full",
+            lambda path, ok, reason: self._on_file_verified(job, path, url, ok, reason)
+        )
+        self.update_verify_label()
+
+    def _on_file_verified(self, job, path, url, ok, reason):
+        """Ghi kết quả kiểm tra vào job và tự tải lại file lỗi"""
+        with self.jobs_lock:
+            job['verification'][path] = 'ok' if ok else reason
+        if ok:
+            event_log.info("Verification passed", job=job['id'], phase="verify", path=path)
+        else:
+            event_log.error(f"Verification failed for {path}: {reason}", job=job['id'], phase="verify",
+                            path=path, reason=reason)
+            if job['attempt'] < MAX_VERIFY_RETRIES and url:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                # Bản tải lại nhận lại đúng tên cũ thay vì "name (1).ext"
+                self.staging.forget(path)
+                retry = self.retry_job(job, url)
+                event_log.info("Re-downloading failed file", job=job['id'], phase="verify",
+                               retry_job=retry['id'], url=url)
+                try:
+                    self.retry_executor.submit(self.download_process, url, None, retry)
+                except RuntimeError:
+                    # App đang đóng
+                    pass
+        self.update_verify_label()
+
+    def update_verify_label(self):
+        """Hiển thị tổng hợp kết quả kiểm tra của tất cả job"""
+        with self.jobs_lock:
+            results = [r for job in self.jobs.values() for r in job['verification'].values()]
+        if not results:
+            self.verify_label.configure(text="")
+            return
+        pending = results.count('pending')
+        passed = results.count('ok')
+        failed = len(results) - pending - passed
+        text = self.lang_manager.get_text("verify_summary", "Verified: {} OK, {} failed, {} pending").format(passed, failed, pending)
+        self.verify_label.configure(text=text, text_color="#e74c3c" if failed else ("yellow" if pending else "#2ecc71"))
 
     def on_closing(self):
         """Xử lý khi đóng ứng dụng"""
         self.music_player.stop()
+        self.retry_executor.shutdown(wait=False, cancel_futures=True)
+        self.verifier.shutdown()
+        self.staging.shutdown()
+        # Đóng nhật ký sau cùng; file đang chuyển dở vẫn ghi sự kiện thẳng ra file sau đó
+        event_log.close()
         self.destroy()
 
 if __name__ == "__main__":